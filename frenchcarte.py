@@ -1,14 +1,16 @@
 import streamlit as st
 from PIL import Image
-import pytesseract
-import re
-from passporteye import read_mrz
-import pycountry
+import io
+from concurrent.futures import ThreadPoolExecutor
+from idutils import (
+    get_country_fullname, convert_date, extract_taille,
+    tesseract_api, prep_for_ocr,
+    _RE_ID, _RE_NAT, _RE_NOM, _RE_PRENOM, _RE_SEXE, _RE_DOB,
+)
 from datetime import datetime
 
 # Configure path to Tesseract executable (adjust as needed)
 
-
 # --- Streamlit Page Setup ---
 st.set_page_config(page_title="🇫🇷 Extracteur Carte Nationale d'Identité Française 🥐", layout="centered")
 st.title("🇫🇷 Extracteur d'Informations de la Carte Nationale d'Identité Française 🥐")
@@ -16,82 +18,55 @@ st.title("🇫🇷 Extracteur d'Informations de la Carte Nationale d'Identité F
 # File upload
 uploaded_file = st.file_uploader("📷 Téléchargez une image de la pièce d'identité", type=["jpg", "jpeg", "png"])
 
-# -------------------------------
-# Helper: Expand country codes to full names
-# -------------------------------
-def get_country_fullname(code):
-    try:
-        country = pycountry.countries.get(alpha_3=code.upper())
-        return f"{country.name} ({code.upper()})"
-    except Exception:
-        return code
-
-# -------------------------------
-# Helper: Convert date (can be from MRZ or OCR) to DD/MM/YYYY
-# Accepts formats like YYMMDD (MRZ) or dd.mm.yyyy / dd/mm/yyyy
-# -------------------------------
-def convert_date(date_str):
-    date_str = date_str.strip()
-    # If format is YYMMDD (MRZ)
-    if re.fullmatch(r'\d{6}', date_str):
-        yy = int(date_str[:2])
-        mm = date_str[2:4]
-        dd = date_str[4:]
-        year = 1900 + yy if yy > 30 else 2000 + yy
-        return f"{dd}/{mm}/{year}"
-    # If format is dd.mm.yyyy or dd/mm/yyyy
-    m = re.fullmatch(r'(\d{2})[./-](\d{2})[./-](\d{4})', date_str)
-    if m:
-        return f"{m.group(1)}/{m.group(2)}/{m.group(3)}"
-    return date_str  # fallback
-
-# -------------------------------
-# Helper: Extract "taille" (size/height) from OCR text
-# -------------------------------
-def extract_taille(ocr_text):
-    match = re.search(r'(?:Taille|T\.|taille)[\s:]*([\d.,]+)', ocr_text)
-    if match:
-        return match.group(1).replace(',', '.').strip()
-    return "Non précisé"
-
 # -------------------------------
 # Function: Extract additional info from OCR text via regex (fallback extraction)
 # -------------------------------
-def extract_info_from_ocr_text(ocr_text):
+def extract_info_from_ocr_text(ocr_text, skip=frozenset()):
     info = {}
-    # Extraction for Carte Nationale d'Identité (ID number)
-    id_match = re.search(r"CARTE NATIONALE D'?IDENTITE(?:\s*Ne\s*[:]?[\s]*)(\d+)", ocr_text, re.IGNORECASE)
-    if id_match:
-        info["Carte nationale d'identité"] = id_match.group(1)
+    # Fields in skip were already validated from the MRZ: don't look for them
+    # Extraction for Carte nationale d'identité (ID number)
+    if "Carte nationale d'identité" not in skip:
+        id_match = _RE_ID.search(ocr_text)
+        if id_match:
+            info["Carte nationale d'identité"] = id_match.group(1)
     # Nationalité extraction
-    nat_match = re.search(r"Nationalité\s*[:]?[\s]*([A-Za-zéèàùçÉÈÀÙÇ]+)", ocr_text, re.IGNORECASE)
-    if nat_match:
-        info["Nationalité"] = nat_match.group(1).title()
+    if "Nationalité" not in skip:
+        nat_match = _RE_NAT.search(ocr_text)
+        if nat_match:
+            info["Nationalité"] = nat_match.group(1).title()
     # Nom de famille extraction (look for "Nom:" or "BC Nom:")
-    nom_match = re.search(r"(?:BC\s*)?Nom\s*[:]?[\s]*([A-Z]+)", ocr_text, re.IGNORECASE)
-    if nom_match:
-        info["Nom de famille"] = nom_match.group(1).title()
+    if "Nom de famille" not in skip:
+        nom_match = _RE_NOM.search(ocr_text)
+        if nom_match:
+            info["Nom de famille"] = nom_match.group(1).title()
     # Prénom(s) extraction
-    prenom_match = re.search(r"Prénom[\(\{]?[sS]?[}\)]?\s*[:]?[\s]*([A-Z]+)", ocr_text, re.IGNORECASE)
-    if prenom_match:
-        info["Prénom"] = prenom_match.group(1).title()
+    if "Prénom" not in skip:
+        prenom_match = _RE_PRENOM.search(ocr_text)
+        if prenom_match:
+            info["Prénom"] = prenom_match.group(1).title()
     # Sexe extraction
-    sexe_match = re.search(r"Sexe\s*[:]?[\s]*([FM])", ocr_text, re.IGNORECASE)
-    if sexe_match:
-        info["Sexe"] = sexe_match.group(1).upper()
+    if "Sexe" not in skip:
+        sexe_match = _RE_SEXE.search(ocr_text)
+        if sexe_match:
+            info["Sexe"] = sexe_match.group(1).upper()
     # Date of Birth extraction - updated regex to capture variations (e.g. Né(e) le or Né(e} ie:)
-    dob_match = re.search(r"N[éeÉÈ]*[\(\{]?e[\)\}]?\s*(?:le|ie)?\s*[:]?\s*([\d]{2}[./-][\d]{2}[./-][\d]{4})", ocr_text, re.IGNORECASE)
-    if dob_match:
-        info["Né(e) le"] = convert_date(dob_match.group(1))
+    if "Né(e) le" not in skip:
+        dob_match = _RE_DOB.search(ocr_text)
+        if dob_match:
+            info["Né(e) le"] = convert_date(dob_match.group(1))
     # Taille extraction
     info["Taille"] = extract_taille(ocr_text)
     return info
 
 # -------------------------------
-# Function: Extract MRZ info and map to French fields
+# Function: Extract MRZ info and map to French fields; also returns the
+# fields whose MRZ checks passed
 # -------------------------------
-def extract_mrz_info(image):
-    mrz = read_mrz(image)
+def extract_mrz_info(file_bytes):
+    # No fixed-band fast path here: passporteye has no French CNI format, so the
+    # old 2x36 card never validates as TD2 and the newer card is 3-line TD1.
+    from passporteye import read_mrz
+    mrz = read_mrz(io.BytesIO(file_bytes))
     if mrz:
         raw = mrz.to_dict()
         # Extract surname and names, clean out '<'
@@ -123,8 +98,60 @@ def extract_mrz_info(image):
             "Date d'expiration": convert_date(exp_raw),
             "Sexe": sexe,
         }
-        return info
-    return {}
+        # Fields the MRZ check digits vouch for; only these take precedence over
+        # the OCR reads (the number and birth date have their own check digits,
+        # the rest need the whole MRZ to validate)
+        fully_valid = raw.get("valid_score") == 100
+        checks = {
+            "Carte nationale d'identité": raw.get("valid_number"),
+            "Né(e) le": raw.get("valid_date_of_birth"),
+            "Nom de famille": fully_valid,
+            "Prénom": fully_valid,
+            "Nationalité": fully_valid,
+            "Sexe": fully_valid,
+        }
+        validated = {label for label, ok in checks.items()
+                     if ok and info[label] and info[label] != "Non précisé"}
+        return info, validated
+    return {}, set()
+
+# -------------------------------
+# Cached OCR / MRZ: keyed on the uploaded bytes so widget reruns are free
+# -------------------------------
+# The card front is one block of text drawn from a small character set, so
+# constrain both: less LSTM search, fewer stray symbols.
+# Characters that can appear on the card front (incl. the MRZ filler '<').
+# German selections skip the whitelist so ä ö ü ß can still come out.
+_OCR_WHITELIST = (
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+    "ÉÈÊËÀÂÙÛÎÏÔÇéèêëàâùûîïôç0123456789<./:-,'() "
+)
+
+# Multi-language selections cost roughly one LSTM pass per language, so try
+# cheaper subsets first and stop at the first read Tesseract is confident in
+_LANG_FALLBACKS = {
+    "eng+fra": ("fra", "eng+fra"),
+    "eng+fra+deu": ("fra", "eng+fra", "eng+fra+deu"),
+}
+_MIN_MEAN_CONF = 60
+
+@st.cache_data(show_spinner=False)
+def _ocr(file_bytes, lang):
+    img = prep_for_ocr(Image.open(io.BytesIO(file_bytes)))
+    for attempt in _LANG_FALLBACKS.get(lang, (lang,)):
+        whitelist = None if "deu" in attempt else _OCR_WHITELIST
+        api, lock = tesseract_api(attempt, "SINGLE_BLOCK", whitelist)
+        with lock:
+            api.SetImage(img)
+            text = api.GetUTF8Text()
+            conf = api.MeanTextConf()
+        if conf >= _MIN_MEAN_CONF:
+            break
+    return text
+
+@st.cache_data(show_spinner=False)
+def _mrz(file_bytes):
+    return extract_mrz_info(file_bytes)
 
 # -------------------------------
 # Streamlit App Logic
@@ -132,14 +159,18 @@ def extract_mrz_info(image):
 selected_languages = st.selectbox("Sélectionnez la langue OCR", ["eng", "fra", "eng+fra", "eng+fra+deu"])
     
 if uploaded_file:
-    image = Image.open(uploaded_file)
+    file_bytes = uploaded_file.getvalue()
+    image = Image.open(io.BytesIO(file_bytes))
     st.image(image, caption="Image téléchargée", use_column_width=True)
 
     with st.spinner("Extraction des informations..."):
-        ocr_text = pytesseract.image_to_string(image, lang=selected_languages)
-        mrz_info = extract_mrz_info(uploaded_file)
-        ocr_info = extract_info_from_ocr_text(ocr_text)
-        taille = extract_taille(ocr_text)
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            ocr_future = ex.submit(_ocr, file_bytes, selected_languages)
+            mrz_future = ex.submit(_mrz, file_bytes)
+            ocr_text = ocr_future.result()
+            mrz_info, mrz_validated = mrz_future.result()
+        # Only MRZ fields that passed their checks suppress the OCR fallback
+        ocr_info = extract_info_from_ocr_text(ocr_text, skip=mrz_validated)
 
     st.subheader("Texte OCR brut :")
     st.text_area("OCR", ocr_text, height=200)
@@ -149,11 +180,9 @@ if uploaded_file:
     if mrz_info:
         final_info.update(mrz_info)
     final_info.update(ocr_info)
-    final_info["Taille"] = taille
 
     if final_info:
-        for field, value in final_info.items():
-            st.write(f"**{field} :** {value}")
+        st.markdown("\n\n".join(f"**{field} :** {value}" for field, value in final_info.items()))
     else:
         st.error("Aucune information n'a pu être extraite.")
 
@@ -0,0 +1,140 @@
+# -------------------------------
+# Shared helpers for the ID extractor pages. Imported (not re-run) by
+# Streamlit, so the compiled patterns and country cache below are built
+# once per process and shared by every page and rerun.
+#
+# Both pages follow the same flow:
+# - the upload is read once (getvalue) and everything works from those bytes
+# - OCR and MRZ run side by side on two threads; tesserocr releases the GIL
+#   while Tesseract works
+# - passporteye is imported inside extract_mrz_info, since it pulls in
+#   OpenCV/scikit-image/scipy and would slow every page load before an upload
+# - results are rendered as one st.markdown block rather than a st.write
+#   (and websocket delta) per field
+# -------------------------------
+import re
+import io
+import threading
+import pycountry
+from PIL import Image
+from functools import lru_cache
+
+# -------------------------------
+# Precompiled regex patterns (compiled once at import, reused on every upload)
+# -------------------------------
+# French card fields, one pattern each (flags inline)
+_RE_ID = re.compile(r"(?i)CARTE NATIONALE D'?IDENTITE(?:\s*Ne\s*[:]?[\s]*)(\d+)")
+_RE_NAT = re.compile(r"(?i)Nationalité\s*[:]?[\s]*([A-Za-zéèàùçÉÈÀÙÇ]+)")
+_RE_NOM = re.compile(r"(?i)(?:BC\s*)?Nom\s*[:]?[\s]*([A-Z]+)")
+_RE_PRENOM = re.compile(r"(?i)Prénom[\(\{]?[sS]?[}\)]?\s*[:]?[\s]*([A-Z]+)")
+_RE_SEXE = re.compile(r"(?i)Sexe\s*[:]?[\s]*([FM])")
+_RE_DOB = re.compile(r"(?i)N[éeÉÈ]*[\(\{]?e[\)\}]?\s*(?:le|ie)?\s*[:]?\s*([\d]{2}[./-][\d]{2}[./-][\d]{4})")
+_RE_TAILLE = re.compile(r'(?:Taille|T\.|taille)[\s:]*([\d.,]+)')
+_RE_MRZ_LINE = re.compile(r'[A-Z0-9<]+')
+# Passport page OCR fallbacks
+_RE_PP_NAME = re.compile(r'P<\w+<<([A-Z<]+)')
+_RE_PP_NUMBER = re.compile(r'\b([A-Z0-9]{8,9})\b')
+
+# -------------------------------
+# Helper: Expand country codes to full names
+# -------------------------------
+@lru_cache(maxsize=None)
+def _countries():
+    # pycountry parses its database lazily on first lookup; force that once here
+    # so it is paid at import time rather than inside the first MRZ request
+    pycountry.countries.get(alpha_3="FRA")
+    return pycountry.countries
+
+@lru_cache(maxsize=512)
+def _country_fullname(code_upper):
+    try:
+        country = _countries().get(alpha_3=code_upper)
+        return f"{country.name} ({code_upper})"
+    except Exception:
+        return None
+
+def get_country_fullname(code):
+    return _country_fullname(code.upper()) or code
+
+# Load the country database, then warm the lookup cache with the codes the
+# pages see most often
+_countries()
+for _code in ("FRA", "IND", "DEU", "GBR", "USA", "BEL", "CHE", "ESP", "ITA"):
+    _country_fullname(_code)
+
+# -------------------------------
+# Helper: Convert date (can be from MRZ or OCR) to DD/MM/YYYY
+# Accepts formats like YYMMDD (MRZ) or dd.mm.yyyy / dd/mm/yyyy
+# -------------------------------
+def convert_date(date_str):
+    s = date_str.strip()
+    n = len(s)
+    # If format is YYMMDD (MRZ)
+    if n == 6 and s.isascii() and s.isdigit():
+        yy = int(s[:2])
+        year = 1900 + yy if yy > 30 else 2000 + yy
+        return f"{s[4:6]}/{s[2:4]}/{year}"
+    # If format is dd.mm.yyyy or dd/mm/yyyy
+    if (n == 10 and s[2] in "./-" and s[5] in "./-"
+            and s[:2].isdigit() and s[3:5].isdigit() and s[6:].isdigit()):
+        return f"{s[:2]}/{s[3:5]}/{s[6:]}"
+    return s  # fallback
+
+# -------------------------------
+# Helper: Extract "taille" (size/height) from OCR text
+# -------------------------------
+def extract_taille(ocr_text):
+    match = _RE_TAILLE.search(ocr_text)
+    if match:
+        return match.group(1).replace(',', '.').strip()
+    return "Non précisé"
+
+# -------------------------------
+# Helper: Preloaded Tesseract handles
+# -------------------------------
+@lru_cache(maxsize=None)
+def tesseract_api(lang, psm="AUTO", whitelist=None):
+    from tesserocr import PyTessBaseAPI, PSM
+    # One handle per configuration, models loaded once per process; the lock
+    # serialises access since a handle is not safe to share between threads
+    api = PyTessBaseAPI(lang=lang, psm=getattr(PSM, psm))
+    if whitelist:
+        api.SetVariable("tessedit_char_whitelist", whitelist)
+    return api, threading.Lock()
+
+# -------------------------------
+# Helper: Grayscale and cap the longest edge at 1600px before page OCR:
+# plenty for ID text, far less Tesseract work
+# -------------------------------
+def prep_for_ocr(img):
+    img = img.convert("L")
+    w, h = img.size
+    s = min(1, 1600 / max(w, h))
+    return img.resize((int(w * s), int(h * s)), Image.LANCZOS) if s < 1 else img
+
+# -------------------------------
+# Helper: Fast MRZ read for already-cropped passport pages (TD3, 2x44 lines).
+# Only used for passports: the French CNI has no format passporteye validates.
+# -------------------------------
+_MRZ_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+
+def read_mrz_fast(file_bytes):
+    # On a cropped passport page the MRZ sits in the bottom third, so OCR
+    # only that band instead of running passporteye's ROI detection and deskew.
+    # Returns None unless two 44-char lines with valid check digits come back.
+    img = Image.open(io.BytesIO(file_bytes))
+    w, h = img.size
+    band = prep_for_ocr(img.crop((0, int(h * 0.65), w, h)))
+    api, lock = tesseract_api("eng", "SINGLE_BLOCK", _MRZ_WHITELIST)
+    with lock:
+        api.SetImage(band)
+        text = api.GetUTF8Text()
+    lines = [line.replace(" ", "") for line in text.splitlines() if line.strip()][-2:]
+    if len(lines) != 2 or not all(len(line) == 44 and _RE_MRZ_LINE.fullmatch(line) for line in lines):
+        return None
+    # Importing passporteye.mrz.text runs passporteye/__init__, which still loads
+    # OpenCV/scikit-image: this path saves the ROI pipeline, not the import.
+    from passporteye.mrz.text import MRZ
+    # from_ocr applies the same O/0, I/1 cleanup read_mrz uses before parsing
+    mrz = MRZ.from_ocr("\n".join(lines))
+    return mrz if mrz.valid else None
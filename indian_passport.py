@@ -1,9 +1,11 @@
 import streamlit as st
 from PIL import Image
-import pytesseract
-import re
-from passporteye import read_mrz
-import pycountry
+import io
+from concurrent.futures import ThreadPoolExecutor
+from idutils import (
+    get_country_fullname, convert_date, tesseract_api, prep_for_ocr, read_mrz_fast,
+    _RE_PP_NAME, _RE_PP_NUMBER,
+)
 
 # Configure path to tesseract executable
 
@@ -16,38 +18,31 @@ st.title("🇮🇳 Indian Passport Information Extractor")
 uploaded_file = st.file_uploader("📷 Upload an image of the passport", type=["jpg", "jpeg", "png"])
 
 # -------------------------------
-# Function: Expand country codes
+# Function: Extract info from Tesseract OCR text
 # -------------------------------
-def get_country_fullname(code):
-    try:
-        country = pycountry.countries.get(alpha_3=code.upper())
-        return f"{country.name} ({code.upper()})"
-    except:
-        return code
-
-# -------------------------------
-# Function: Extract info using Tesseract OCR
-# -------------------------------
-def extract_text_info(image):
-    text = pytesseract.image_to_string(image)
+def extract_text_info(text):
     info = {}
 
     # Regex for matching various fields (Optional — depends on formatting)
-    name_match = re.search(r'P<\w+<<([A-Z<]+)', text)
-    passport_number = re.search(r'\b([A-Z0-9]{8,9})\b', text)
+    name_match = _RE_PP_NAME.search(text)
+    passport_number = _RE_PP_NUMBER.search(text)
 
     if name_match:
         info["Name"] = name_match.group(1).replace("<", " ").strip().title()
     if passport_number:
         info["Passport Number"] = passport_number.group(1)
 
-    return info, text
+    return info
 
 # -------------------------------
 # Function: Extract MRZ data
 # -------------------------------
-def extract_mrz_info(image):
-    mrz = read_mrz(image)
+def extract_mrz_info(file_bytes):
+    # Try the cheap fixed-band read first (44-char MRZ lines)
+    mrz = read_mrz_fast(file_bytes)
+    if mrz is None:
+        from passporteye import read_mrz
+        mrz = read_mrz(io.BytesIO(file_bytes))
     if mrz:
         raw = mrz.to_dict()
         # Fixing name extraction from MRZ
@@ -72,27 +67,34 @@ def extract_mrz_info(image):
     return {}
 
 # -------------------------------
-# Helper: Convert date from YYMMDD to DD/MM/YYYY
+# Cached OCR / MRZ: keyed on the uploaded bytes so reruns are free
 # -------------------------------
-def convert_date(ymd):
-    if len(ymd) != 6:
-        return ymd
-    yy = int(ymd[:2])
-    mm = ymd[2:4]
-    dd = ymd[4:]
-    year = 1900 + yy if yy > 30 else 2000 + yy
-    return f"{dd}/{mm}/{year}"
+@st.cache_data(show_spinner=False)
+def _ocr(file_bytes):
+    api, lock = tesseract_api("eng")
+    with lock:
+        api.SetImage(prep_for_ocr(Image.open(io.BytesIO(file_bytes))))
+        return api.GetUTF8Text()
+
+@st.cache_data(show_spinner=False)
+def _mrz(file_bytes):
+    return extract_mrz_info(file_bytes)
 
 # -------------------------------
 # Streamlit Logic
 # -------------------------------
 if uploaded_file:
-    image = Image.open(uploaded_file)
+    file_bytes = uploaded_file.getvalue()
+    image = Image.open(io.BytesIO(file_bytes))
     st.image(image, caption="📄 Uploaded Passport", use_column_width=True)
 
     with st.spinner("🔍 Extracting info..."):
-        extracted_info, raw_text = extract_text_info(image)
-        mrz_info = extract_mrz_info(uploaded_file)
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            ocr_future = ex.submit(_ocr, file_bytes)
+            mrz_future = ex.submit(_mrz, file_bytes)
+            raw_text = ocr_future.result()
+            mrz_info = mrz_future.result()
+        extracted_info = extract_text_info(raw_text)
 
     # Show raw OCR text
     st.subheader("📜 OCR Text:")
@@ -101,16 +103,14 @@ if uploaded_file:
     # Show extracted basic info
     st.subheader("📌 Extracted Info (from text):")
     if extracted_info:
-        for key, value in extracted_info.items():
-            st.write(f"**{key}:** {value}")
+        st.markdown("\n\n".join(f"**{key}:** {value}" for key, value in extracted_info.items()))
     else:
         st.warning("⚠️ OCR couldn’t extract reliable info. Try clearer photo or rely on MRZ.")
 
     # Show MRZ Info
     if mrz_info:
         st.subheader("🔎 MRZ Extracted Info:")
-        for key, value in mrz_info.items():
-            st.write(f"**{key}:** {value}")
+        st.markdown("\n\n".join(f"**{key}:** {value}" for key, value in mrz_info.items()))
     else:
         st.error("❌ No valid MRZ data found.")
 